@@ -7,7 +7,10 @@ from datetime import datetime, timezone, timedelta
 import os
 import sqlite3
 import logging
+import json
 import sys
+from db_schema import create_trade_tables
+from bot_config import CONFIG_FILE, TUNABLE_SETTINGS, config_fingerprint, parse_config, read_config_data
 
 log_formatter = logging.Formatter('%(asctime)s - %(message)s')
 logger = logging.getLogger()
@@ -26,11 +29,7 @@ cur = con.cursor()
 
 
 def initialize_database():
-    cur.execute('''CREATE TABLE IF NOT EXISTS trades (
-        id INTEGER PRIMARY KEY, timestamp TEXT, pair TEXT, direction TEXT,
-        entry_price REAL, quantity REAL, status TEXT, 
-        stop_loss REAL, take_profit REAL, pnl REAL
-    )''')
+    create_trade_tables(cur)
     cur.execute('''CREATE TABLE IF NOT EXISTS bot_logs (id INTEGER PRIMARY KEY, timestamp TEXT, log_level TEXT, message TEXT)''')
     cur.execute('''CREATE TABLE IF NOT EXISTS bot_status (key TEXT PRIMARY KEY, value TEXT, last_updated TEXT)''')
     cur.execute("INSERT OR IGNORE INTO bot_status (key, value) VALUES ('loss_limit_days_in_a_row', '0')")
@@ -38,18 +37,20 @@ def initialize_database():
 
 
 def prune_trade_history():
-    """Keeps the trade history limited to the last MAX_TRADE_HISTORY records."""
+    """Moves closed trades beyond the last MAX_TRADE_HISTORY records into trades_archive."""
     try:
         cur.execute("SELECT COUNT(*) FROM trades")
         count = cur.fetchone()[0]
         if count > MAX_TRADE_HISTORY:
-            num_to_delete = count - MAX_TRADE_HISTORY
-            cur.execute(f"SELECT id FROM trades ORDER BY id ASC LIMIT {num_to_delete}")
-            ids_to_delete = cur.fetchall()
-            delete_ids = [item['id'] for item in ids_to_delete]
-            cur.executemany("DELETE FROM trades WHERE id = ?", [(id,) for id in delete_ids])
+            num_to_archive = count - MAX_TRADE_HISTORY
+            cur.execute(f"SELECT id FROM trades WHERE status != 'open' ORDER BY id ASC LIMIT {num_to_archive}")
+            ids_to_archive = cur.fetchall()
+            archive_ids = [(item['id'],) for item in ids_to_archive]
+            cur.executemany("INSERT INTO trades_archive SELECT * FROM trades WHERE id = ?", archive_ids)
+            cur.executemany("DELETE FROM trades WHERE id = ?", archive_ids)
             con.commit()
     except Exception as e:
+        con.rollback()
         logger.error(f"Error pruning trade history: {e}")
 
 
@@ -89,6 +90,17 @@ def update_heartbeat():
         logger.error(f"Failed to update heartbeat: {e}")
 
 
+def update_config_status(result, fingerprint, error=None):
+    """Records which version of CONFIG_FILE (by fingerprint) was last applied or rejected."""
+    try:
+        status = json.dumps({'result': result, 'fingerprint': fingerprint, 'error': error})
+        cur.execute("REPLACE INTO bot_status (key, value, last_updated) VALUES (?, ?, ?)",
+                    ('config', status, datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')))
+        con.commit()
+    except Exception as e:
+        logger.error(f"Failed to update config status: {e}")
+
+
 exchange = ccxt.binance({'apiKey': os.getenv('BINANCE_API_KEY'), 'secret': os.getenv('BINANCE_API_SECRET'), 'enableRateLimit': True, 'options': {'defaultType': 'future'}})
 PAIRS = ['SOL/USDT', 'LTC/USDT']
 TIMEFRAME = '5m'
@@ -114,10 +126,50 @@ profit_target_reached = False
 consecutive_loss_limit_reached = False
 last_trade_times = {}
 
+DEFAULT_SETTINGS = {key: globals()[key] for key in TUNABLE_SETTINGS}
+config_mtime = None
+
+
+def reload_config():
+    """Applies CONFIG_FILE over the defaults above if it changed since the last call.
 
-def setup_leverage_and_mode():
-    logger.info(f"Setting up leverage and margin mode for all pairs...")
-    for pair in PAIRS:
+    All settings are swapped in together, and only between bars, so a cycle never mixes
+    old and new values. Open positions, cooldowns and the paper balance are left alone.
+    Returns the pairs whose exchange leverage needs setting up again.
+    """
+    global config_mtime
+    try:
+        mtime = os.stat(CONFIG_FILE).st_mtime_ns
+    except FileNotFoundError:
+        mtime = 0
+    if mtime == config_mtime: return set()
+    config_mtime = mtime
+    fingerprint = None
+    try:
+        data = read_config_data()
+        fingerprint = config_fingerprint(data)
+        overrides = parse_config(data)
+    except (OSError, ValueError) as e:
+        logger.error(f"Ignoring {CONFIG_FILE}, keeping current settings: {e}")
+        update_config_status('rejected', fingerprint, str(e))
+        return set()
+
+    old_leverage = {pair: LEVERAGE_SETTINGS.get(pair, DEFAULT_LEVERAGE) for pair in PAIRS}
+    new_settings = {**DEFAULT_SETTINGS, **overrides}
+    changed = sorted(key for key, value in new_settings.items() if globals()[key] != value)
+    globals().update(new_settings)
+    update_config_status('applied', fingerprint)
+    if not changed: return set()
+
+    logger.info(f"Config reloaded. Changed: {', '.join(changed)}")
+    return {pair for pair in PAIRS if old_leverage.get(pair) != LEVERAGE_SETTINGS.get(pair, DEFAULT_LEVERAGE)}
+
+
+def setup_leverage_and_mode(pairs=None):
+    if pairs is None:
+        logger.info(f"Setting up leverage and margin mode for all pairs...")
+        pairs = PAIRS
+    for pair in pairs:
         try:
             leverage = LEVERAGE_SETTINGS.get(pair, DEFAULT_LEVERAGE)
             exchange.set_margin_mode('isolated', symbol=pair)
@@ -259,19 +311,17 @@ def manage_open_positions():
                 elif low_price <= trade['take_profit']: is_win = True
 
             if is_win or is_loss:
-                leverage = LEVERAGE_SETTINGS.get(trade['pair'], DEFAULT_LEVERAGE)
-                margin_used = (trade['entry_price'] * trade['quantity']) / leverage
-                risk_amount_dollars = margin_used * RISK_PCT_OF_MARGIN
-
+                # Settle from the trade's own stop/target rather than the current settings,
+                # which may have been reloaded since the trade was opened.
                 pnl = 0
                 status = ""
                 if is_win:
-                    pnl = risk_amount_dollars * REWARD_MULTIPLIER
+                    pnl = abs(trade['take_profit'] - trade['entry_price']) * trade['quantity']
                     status = "win"
                     consecutive_losses = 0
                     logger.info(f"TRADE CLOSED (WIN): {trade['pair']}. PnL: ${pnl:.2f}")
                 else:
-                    pnl = -risk_amount_dollars
+                    pnl = -abs(trade['stop_loss'] - trade['entry_price']) * trade['quantity']
                     status = "loss"
                     consecutive_losses += 1
                     logger.warning(
@@ -336,6 +386,7 @@ def run_bot():
         logger.critical(f"CRITICAL ERROR on startup: {e}. Bot cannot start.")
         sys.exit(1)
 
+    reload_config()
     setup_leverage_and_mode()
     last_checked_day = datetime.now(timezone.utc).day
     daily_starting_balance = paper_balance
@@ -356,6 +407,9 @@ def run_bot():
                 last_checked_day = now_utc.day
 
             if now_utc.minute % 5 == 0:
+                pairs_to_setup = reload_config()
+                if pairs_to_setup:
+                    setup_leverage_and_mode(pairs_to_setup)
                 update_heartbeat()
                 loss_limit_hit_this_cycle = manage_open_positions()
                 if not consecutive_loss_limit_reached and loss_limit_hit_this_cycle:
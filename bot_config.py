@@ -0,0 +1,130 @@
+# bot_config.py - Settings that can be changed while Aladdin is running
+import hashlib
+import json
+import math
+import os
+import tempfile
+
+CONFIG_FILE = 'bot_config.json'
+
+# Every setting that may be overridden from CONFIG_FILE, and the type its value must have.
+# Anything not listed here (e.g. TIMEFRAME, which sets the bar cadence) still needs a restart.
+TUNABLE_SETTINGS = {
+    'PAIRS': list,
+    'DEFAULT_LEVERAGE': int,
+    'LEVERAGE_SETTINGS': dict,
+    'DAILY_PROFIT_TARGET': float,
+    'MAX_OPEN_POSITIONS': int,
+    'MAX_CONSECUTIVE_LOSSES': int,
+    'API_MAX_RETRIES': int,
+    'API_RETRY_DELAY': float,
+    'MAX_ERROR_LOGS': int,
+    'MAX_TRADE_HISTORY': int,
+    'TRADE_COOLDOWN_MINUTES': float,
+    'MARGIN_PCT_OF_CAPITAL': float,
+    'RISK_PCT_OF_MARGIN': float,
+    'REWARD_MULTIPLIER': float,
+}
+
+# Bounds on top of the type check, so a bad edit can't stall or blow up the engine.
+FRACTION_SETTINGS = {'DAILY_PROFIT_TARGET', 'MARGIN_PCT_OF_CAPITAL', 'RISK_PCT_OF_MARGIN'}  # in (0, 1]
+COUNT_SETTINGS = {'DEFAULT_LEVERAGE', 'MAX_OPEN_POSITIONS', 'MAX_CONSECUTIVE_LOSSES', 'API_MAX_RETRIES',
+                  'MAX_ERROR_LOGS', 'MAX_TRADE_HISTORY'}  # at least 1
+POSITIVE_SETTINGS = {'REWARD_MULTIPLIER'}  # greater than 0
+MAX_LEVERAGE = 100
+MAX_VALUES = {
+    'DEFAULT_LEVERAGE': MAX_LEVERAGE,
+    'API_MAX_RETRIES': 10,
+    'API_RETRY_DELAY': 60,
+    'TRADE_COOLDOWN_MINUTES': 24 * 60,
+    'REWARD_MULTIPLIER': 10,
+}
+
+
+def is_number(value, kind):
+    if isinstance(value, bool): return False
+    if kind is float: return isinstance(value, (int, float))
+    return isinstance(value, int)
+
+
+def validate_config(config):
+    """Returns a checked copy of config, raising ValueError on unknown settings or bad values."""
+    if not isinstance(config, dict):
+        raise ValueError("Config must be a JSON object.")
+    checked = {}
+    for key, value in config.items():
+        kind = TUNABLE_SETTINGS.get(key)
+        if kind is None:
+            raise ValueError(f"Unknown setting: {key}")
+        if kind in (int, float):
+            if not is_number(value, kind):
+                raise ValueError(f"{key} must be a number.")
+            value = kind(value)
+            if not math.isfinite(value):
+                raise ValueError(f"{key} must be a finite number.")
+            if key in FRACTION_SETTINGS and not 0 < value <= 1:
+                raise ValueError(f"{key} must be a fraction in (0, 1].")
+            if key in COUNT_SETTINGS and value < 1:
+                raise ValueError(f"{key} must be at least 1.")
+            if key in POSITIVE_SETTINGS and value <= 0:
+                raise ValueError(f"{key} must be greater than 0.")
+            if value < 0:
+                raise ValueError(f"{key} must not be negative.")
+            if key in MAX_VALUES and value > MAX_VALUES[key]:
+                raise ValueError(f"{key} must be at most {MAX_VALUES[key]}.")
+        elif key == 'PAIRS':
+            if not isinstance(value, list) or not value or not all(isinstance(pair, str) and pair for pair in value):
+                raise ValueError("PAIRS must be a non-empty list of symbols.")
+        elif key == 'LEVERAGE_SETTINGS':
+            if not isinstance(value, dict) or not all(is_number(lev, int) and 1 <= lev <= MAX_LEVERAGE for lev in value.values()):
+                raise ValueError(f"LEVERAGE_SETTINGS must map symbols to integers from 1 to {MAX_LEVERAGE}.")
+        checked[key] = value
+    return checked
+
+
+def read_config_data():
+    """Returns the raw contents of CONFIG_FILE, or None if there is no file."""
+    if not os.path.exists(CONFIG_FILE): return None
+    with open(CONFIG_FILE, 'rb') as f:
+        return f.read()
+
+
+def config_fingerprint(data):
+    """Identifies one version of CONFIG_FILE, so the dashboard can tell whether the bot has applied it."""
+    return hashlib.sha1(data).hexdigest() if data is not None else None
+
+
+def parse_config(data):
+    if data is None: return {}
+    return validate_config(json.loads(data))
+
+
+def read_config():
+    """Returns the validated overrides in CONFIG_FILE, or {} if there is no file."""
+    return parse_config(read_config_data())
+
+
+def merge_config(current, edits):
+    """Applies edits over current; a null value drops that override so its default applies again."""
+    if not isinstance(edits, dict):
+        raise ValueError("Expected a JSON object of settings.")
+    for key in edits:
+        if key not in TUNABLE_SETTINGS:
+            raise ValueError(f"Unknown setting: {key}")
+    merged = {**current, **edits}
+    return {key: value for key, value in merged.items() if value is not None}
+
+
+def write_config(config):
+    """Validates config and replaces CONFIG_FILE in one step, so the bot never reads a half-written file."""
+    config = validate_config(config)
+    config_dir = os.path.dirname(os.path.abspath(CONFIG_FILE))
+    with tempfile.NamedTemporaryFile('w', dir=config_dir, prefix=os.path.basename(CONFIG_FILE) + '.',
+                                     suffix='.tmp', delete=False) as f:
+        json.dump(config, f, indent=2, sort_keys=True, allow_nan=False)
+    try:
+        os.replace(f.name, CONFIG_FILE)
+    except OSError:
+        os.remove(f.name)
+        raise
+    return config
@@ -1,12 +1,20 @@
 # dashboard - A Dashboard for the Aladdin Bot
 
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, request
 import sqlite3
 from datetime import datetime, timedelta
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+import json
+import queue
+import threading
 import subprocess
 import os
 import signal
 from waitress import serve
+from db_schema import create_trade_tables
+from bot_config import config_fingerprint, merge_config, parse_config, read_config, read_config_data, write_config
 
 app = Flask(__name__)
 
@@ -14,6 +22,22 @@ DATABASE_FILE = 'trading_bot.db'
 BOT_SCRIPT_FILE = 'aladdin.py'
 PID_FILE = 'bot.pid'
 LOG_FILE = 'bot_output.log'
+READ_POOL_SIZE = 4
+RESPONSE_CACHE_SIZE = 64
+TRADES_PAGE_SIZE = 100
+MAX_TRADES_PAGE_SIZE = 500
+EQUITY_POINTS = 500
+MAX_EQUITY_POINTS = 5000
+
+_read_pool = queue.LifoQueue(maxsize=READ_POOL_SIZE)
+_version_conn = None
+_version_lock = threading.Lock()
+_schema_ready = False
+_schema_lock = threading.Lock()
+_config_lock = threading.Lock()
+_result_cache = OrderedDict()
+_result_cache_lock = threading.Lock()
+_build_locks = {}
 
 def is_bot_running():
     if not os.path.exists(PID_FILE): return False
@@ -25,11 +49,91 @@ def is_bot_running():
         os.remove(PID_FILE); return False
     return True
 
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
+def open_read_connection():
+    conn = sqlite3.connect(f'file:{DATABASE_FILE}?mode=ro', uri=True, check_same_thread=False)
     conn.row_factory = sqlite3.Row
     return conn
 
+@contextmanager
+def read_connection():
+    """Borrows a read-only connection from the pool, opening one if the pool is empty."""
+    try:
+        conn = _read_pool.get_nowait()
+    except queue.Empty:
+        conn = open_read_connection()
+    try:
+        yield conn
+    except Exception:
+        conn.close()
+        raise
+    try:
+        _read_pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+def get_data_version():
+    """Returns SQLite's data_version, which moves whenever another connection commits.
+
+    The value is only comparable on the same connection, so one dedicated
+    connection is kept for it. Returns None if the database can't be read.
+    """
+    global _version_conn
+    with _version_lock:
+        try:
+            if _version_conn is None:
+                _version_conn = open_read_connection()
+            return _version_conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error:
+            if _version_conn is not None:
+                _version_conn.close()
+                _version_conn = None
+            return None
+
+def ensure_schema():
+    """Creates the trade archive tables if the bot hasn't yet, so an older database still reads correctly."""
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready: return
+        conn = sqlite3.connect(DATABASE_FILE)
+        try:
+            create_trade_tables(conn)
+            conn.commit()
+            _schema_ready = True
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+
+def cached_result(key, build):
+    """Returns build(conn), re-running it only when the database has changed since the last call."""
+    if not _schema_ready: ensure_schema()
+    version = get_data_version()
+    with _result_cache_lock:
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+    with build_lock:
+        with _result_cache_lock:
+            entry = _result_cache.get(key)
+            if entry is not None and version is not None and entry[0] == version:
+                _result_cache.move_to_end(key)
+                return entry[1]
+        with read_connection() as conn:
+            result = build(conn)
+        if version is not None:
+            with _result_cache_lock:
+                _result_cache[key] = (version, result)
+                _result_cache.move_to_end(key)
+                while len(_result_cache) > RESPONSE_CACHE_SIZE:
+                    stale_key, _ = _result_cache.popitem(last=False)
+                    _build_locks.pop(stale_key, None)
+        return result
+
+def etag_response(*args, **kwargs):
+    """jsonify() with an ETag, answering 304 when the client already has this body."""
+    response = jsonify(*args, **kwargs)
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -63,7 +167,7 @@ def stop_bot():
 def api_live_output():
     try:
         with open(LOG_FILE, 'r') as f: lines = f.readlines()
-        return jsonify(output=''.join(lines[-30:]))
+        return etag_response(output=''.join(lines[-30:]))
     except Exception:
         return jsonify(output="Log file not found or is empty.")
 
@@ -71,57 +175,174 @@ def api_live_output():
 def api_status():
     status_info = {"status": "Stopped", "last_heartbeat": "N/A"}
     if is_bot_running():
-        conn = get_db_connection()
         try:
-            heartbeat_data = conn.execute("SELECT last_updated FROM bot_status WHERE key = 'heartbeat'").fetchone()
-            if heartbeat_data:
-                last_heartbeat_utc = datetime.strptime(heartbeat_data['last_updated'], '%Y-%m-%d %H:%M:%S')
+            last_updated = cached_result('heartbeat', fetch_heartbeat)
+            if last_updated:
+                last_heartbeat_utc = datetime.strptime(last_updated, '%Y-%m-%d %H:%M:%S')
                 status_info['status'] = "Running" if datetime.utcnow() - last_heartbeat_utc < timedelta(minutes=7) else "Stalled"
-                status_info['last_heartbeat'] = heartbeat_data['last_updated'] + " UTC"
+                status_info['last_heartbeat'] = last_updated + " UTC"
             else:
                  status_info['status'] = "Starting..."
         except Exception as e:
             status_info['status'] = "Error"; status_info['last_heartbeat'] = str(e)
-        conn.close()
-    return jsonify(status=status_info)
+    return etag_response(status=status_info)
+
+def fetch_heartbeat(conn):
+    heartbeat_data = conn.execute("SELECT last_updated FROM bot_status WHERE key = 'heartbeat'").fetchone()
+    return heartbeat_data['last_updated'] if heartbeat_data else None
 
 @app.route('/api/performance')
 def api_performance():
-    conn = get_db_connection()
-    wins = conn.execute("SELECT COUNT(*) FROM trades WHERE status = 'win'").fetchone()[0]
-    losses = conn.execute("SELECT COUNT(*) FROM trades WHERE status = 'loss'").fetchone()[0]
+    # The PnL windows are relative to 'now', so the UTC date is part of the key.
+    performance = cached_result(('performance', datetime.utcnow().date()), fetch_performance)
+    return etag_response(**performance)
+
+def fetch_performance(conn):
+    wins = conn.execute("SELECT COUNT(*) FROM trade_history WHERE status = 'win'").fetchone()[0]
+    losses = conn.execute("SELECT COUNT(*) FROM trade_history WHERE status = 'loss'").fetchone()[0]
     total_trades = wins + losses
     win_percentage = (wins / total_trades * 100) if total_trades > 0 else 0
-    pnl_today_utc = conn.execute("SELECT SUM(pnl) FROM trades WHERE status IN ('win', 'loss') AND date(timestamp) = date('now', 'utc')").fetchone()[0] or 0
-    pnl_this_month_utc = conn.execute("SELECT SUM(pnl) FROM trades WHERE status IN ('win', 'loss') AND strftime('%Y-%m', timestamp) = strftime('%Y-%m', 'now', 'utc')").fetchone()[0] or 0
-    pnl_this_year_utc = conn.execute("SELECT SUM(pnl) FROM trades WHERE status IN ('win', 'loss') AND strftime('%Y', timestamp) = strftime('%Y', 'now', 'utc')").fetchone()[0] or 0
-    conn.close()
-    return jsonify(
+    pnl_today_utc = conn.execute("SELECT SUM(pnl) FROM trade_history WHERE status IN ('win', 'loss') AND date(timestamp) = date('now', 'utc')").fetchone()[0] or 0
+    pnl_this_month_utc = conn.execute("SELECT SUM(pnl) FROM trade_history WHERE status IN ('win', 'loss') AND strftime('%Y-%m', timestamp) = strftime('%Y-%m', 'now', 'utc')").fetchone()[0] or 0
+    pnl_this_year_utc = conn.execute("SELECT SUM(pnl) FROM trade_history WHERE status IN ('win', 'loss') AND strftime('%Y', timestamp) = strftime('%Y', 'now', 'utc')").fetchone()[0] or 0
+    return dict(
         win_percentage=win_percentage, total_trades=total_trades, wins=wins, losses=losses,
         pnl_today=pnl_today_utc, pnl_this_month=pnl_this_month_utc, pnl_this_year=pnl_this_year_utc,
     )
 
 @app.route('/api/trades')
 def api_trades():
-    conn = get_db_connection()
+    """Newest trades first; pass the last id seen as ?before_id= to get the next page."""
+    before_id = request.args.get('before_id', type=int)
+    limit = max(1, min(request.args.get('limit', TRADES_PAGE_SIZE, type=int), MAX_TRADES_PAGE_SIZE))
     trades = []
     try:
-        trade_data = conn.execute("SELECT timestamp, pair, direction, entry_price, status, pnl FROM trades ORDER BY id DESC LIMIT 100").fetchall()
-        trades = [dict(row) for row in trade_data]
+        trades = cached_result(('trades', before_id, limit), lambda conn: fetch_trades(conn, before_id, limit))
+    except Exception: pass
+    return etag_response(trades)
+
+def fetch_trades(conn, before_id, limit):
+    if before_id is None: before_id = 2 ** 63 - 1
+    # Each table is walked backwards by rowid on its own, so a page costs O(limit) however long the archive gets.
+    trade_data = conn.execute(
+        "SELECT * FROM (SELECT id, timestamp, pair, direction, entry_price, status, pnl FROM trades WHERE id < ? ORDER BY id DESC LIMIT ?) "
+        "UNION ALL "
+        "SELECT * FROM (SELECT id, timestamp, pair, direction, entry_price, status, pnl FROM trades_archive WHERE id < ? ORDER BY id DESC LIMIT ?) "
+        "ORDER BY id DESC LIMIT ?",
+        (before_id, limit, before_id, limit, limit)).fetchall()
+    return [dict(row) for row in trade_data]
+
+@app.route('/api/equity')
+def api_equity():
+    """Cumulative PnL of closed trades, downsampled to at most ?points= points."""
+    points = max(3, min(request.args.get('points', EQUITY_POINTS, type=int), MAX_EQUITY_POINTS))
+    equity = {'points': [], 'total_trades': 0}
+    try:
+        equity = cached_result(('equity', points), lambda conn: fetch_equity(conn, points))
     except Exception: pass
-    conn.close()
-    return jsonify(trades)
+    return etag_response(**equity)
+
+def fetch_equity(conn, points):
+    series = fetch_equity_series(conn)
+    return {'points': downsample_lttb(series, points), 'total_trades': len(series)}
+
+def fetch_equity_series(conn):
+    trade_data = conn.execute("SELECT id, timestamp, pnl FROM trade_history WHERE status IN ('win', 'loss') ORDER BY id").fetchall()
+    series, cumulative_pnl = [], 0
+    for n, row in enumerate(trade_data):
+        cumulative_pnl += row['pnl'] or 0
+        series.append({'n': n, 'id': row['id'], 'timestamp': row['timestamp'], 'cumulative_pnl': cumulative_pnl})
+    return series
+
+def downsample_lttb(series, threshold):
+    """Largest-Triangle-Three-Buckets: keeps the threshold points that best preserve the curve's shape.
+
+    Trade sequence number is used as x, so bursts of trades aren't squashed together.
+    """
+    n = len(series)
+    if n <= threshold:
+        return series
+    sampled = [series[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = (end + next_end - 1) / 2
+        avg_y = sum(p['cumulative_pnl'] for p in series[end:next_end]) / (next_end - end)
+        a_y = series[a]['cumulative_pnl']
+        best, best_area = start, -1
+        for j in range(start, end):
+            area = abs((a - avg_x) * (series[j]['cumulative_pnl'] - a_y) - (a - j) * (avg_y - a_y))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(series[best])
+        a = best
+    sampled.append(series[-1])
+    return sampled
 
 @app.route('/api/error_logs')
 def api_error_logs():
-    conn = get_db_connection()
     errors = []
     try:
-        error_data = conn.execute("SELECT timestamp, message FROM bot_logs WHERE log_level IN ('ERROR', 'CRITICAL') ORDER BY id DESC LIMIT 10").fetchall()
-        errors = [f"[{row['timestamp']}] {row['message']}" for row in error_data]
+        errors = cached_result('error_logs', fetch_error_logs)
     except Exception: pass
-    conn.close()
-    return jsonify(errors=errors)
+    return etag_response(errors=errors)
+
+def fetch_error_logs(conn):
+    error_data = conn.execute("SELECT timestamp, message FROM bot_logs WHERE log_level IN ('ERROR', 'CRITICAL') ORDER BY id DESC LIMIT 10").fetchall()
+    return [f"[{row['timestamp']}] {row['message']}" for row in error_data]
+
+@app.route('/api/config')
+def api_config():
+    """The overrides in the config file, and whether the running bot has applied this version of it."""
+    try:
+        data = read_config_data()
+    except Exception as e:
+        return jsonify(status="error", message=f"Failed to read config: {str(e)}")
+    config, error = {}, None
+    try:
+        config = parse_config(data)
+    except ValueError as e:
+        error = f"Config file is invalid: {str(e)}"
+    applied, last_checked = "not running", None
+    if is_bot_running():
+        applied = "pending"
+        try:
+            config_status = cached_result('config_status', fetch_config_status)
+            if config_status and config_status['fingerprint'] == config_fingerprint(data):
+                applied, last_checked = config_status['result'], config_status['last_updated']
+                error = config_status['error'] or error
+        except Exception: pass
+    return etag_response(config=config, applied=applied, last_checked=last_checked, error=error)
+
+@app.route('/api/config', methods=['POST'])
+def update_config():
+    """Merges the posted settings into the config file; the bot applies them at its next bar.
+
+    A null value removes that override. With ?replace=1 the posted settings replace the file outright.
+    """
+    edits = request.get_json(silent=True)
+    try:
+        with _config_lock:
+            current = {}
+            if not request.args.get('replace', type=int):
+                try:
+                    current = read_config()
+                except ValueError as e:
+                    return jsonify(status="error", message=f"Current config file is invalid ({str(e)}). POST with ?replace=1 to overwrite it.")
+            config = write_config(merge_config(current, edits))
+        return jsonify(status="success", message="Config saved. The bot will apply it at the next bar.", config=config)
+    except ValueError as e:
+        return jsonify(status="error", message=str(e))
+    except Exception as e:
+        return jsonify(status="error", message=f"Failed to save config: {str(e)}")
+
+def fetch_config_status(conn):
+    status_data = conn.execute("SELECT value, last_updated FROM bot_status WHERE key = 'config'").fetchone()
+    if not status_data: return None
+    return {**json.loads(status_data['value']), 'last_updated': status_data['last_updated']}
 
 if __name__ == '__main__':
     print("Starting production server with Waitress...")
@@ -0,0 +1,17 @@
+# db_schema.py - Trade tables shared by aladdin.py and dashboard.py
+
+
+def create_trade_tables(cur):
+    """Creates the trades table, its archive and the trade_history view over both, if missing."""
+    cur.execute('''CREATE TABLE IF NOT EXISTS trades (
+        id INTEGER PRIMARY KEY, timestamp TEXT, pair TEXT, direction TEXT,
+        entry_price REAL, quantity REAL, status TEXT,
+        stop_loss REAL, take_profit REAL, pnl REAL
+    )''')
+    cur.execute('''CREATE TABLE IF NOT EXISTS trades_archive (
+        id INTEGER PRIMARY KEY, timestamp TEXT, pair TEXT, direction TEXT,
+        entry_price REAL, quantity REAL, status TEXT,
+        stop_loss REAL, take_profit REAL, pnl REAL
+    )''')
+    cur.execute('''CREATE VIEW IF NOT EXISTS trade_history AS
+        SELECT * FROM trades UNION ALL SELECT * FROM trades_archive''')